@@ -1,69 +1,150 @@
 import pandas as pd
 import numpy as np
 
+try:
+    import dask.dataframe as dd
+except ImportError:  # dask is optional, only needed for out-of-core loan tables
+    dd = None
+
+def _shared_categories(*columns: pd.Series) -> pd.CategoricalDtype:
+    """Categorical dtype covering the values of all given columns."""
+    return pd.CategoricalDtype(pd.concat(columns, ignore_index=True).dropna().unique())
+
+def _bank_totals(loans: pd.DataFrame, firm_ids: pd.Index, firm_intensities: np.ndarray) -> pd.DataFrame:
+    """Sum the MSA loss of a batch of loans per bank, using integer bank codes + weighted bincount."""
+    rows = firm_ids.get_indexer(loans['firm_id'])
+    msa = firm_intensities[rows] * loans['loan_amount'].to_numpy(dtype=np.float64)[:, None]
+    msa[np.isnan(msa)] = 0.0
+
+    # As with groupby-sum, missing bank ids are dropped and missing footprints count as zero
+    codes, bank_ids = pd.factorize(loans['bank_id'])
+    valid = codes >= 0
+    return pd.DataFrame({
+        'msa_ghg_total': np.bincount(codes[valid], weights=msa[valid, 0], minlength=len(bank_ids)),
+        'msa_lu_total': np.bincount(codes[valid], weights=msa[valid, 1], minlength=len(bank_ids))
+    }, index=pd.Index(bank_ids, name='bank_id'))
+
+def precompute_indirect_intensities(
+    direct_intensity_vector: pd.DataFrame,
+    leontief_inverse: pd.DataFrame,
+    dtype: type = None
+) -> pd.DataFrame:
+    """
+    Compute upstream-inclusive MSA-loss intensities per country-sector, F_tot = L' x F.
+
+    These only change with the MRIO/GLOBIO inputs, so they can be computed once and
+    passed to `compute_bank_biodiversity_footprint` for every bank, quarter or scenario.
+
+    Parameters:
+    - direct_intensity_vector: DataFrame indexed by (country, sector) with columns:
+        ['msa_ghg_per_eur', 'msa_lu_per_eur']
+    - leontief_inverse: Leontief inverse matrix indexed/columned by (country, sector)
+    - dtype: precision of the L' x F product; defaults to L's own dtype. Store L as
+        float32 upstream to halve the bytes read from it (forcing float32 on a float64 L
+        costs a full converted copy instead)
+
+    Returns:
+    - DataFrame indexed like leontief_inverse with columns:
+        ['msa_ghg_total_per_eur', 'msa_lu_total_per_eur']
+    """
+    # Summing L' x diag(F) across inputs equals L' x F, so the diagonal
+    # matrix is never built. Both pressures are stacked as the columns of F
+    # so L is read once for GHG and land use together.
+    L = leontief_inverse.to_numpy(dtype=dtype, copy=False)
+    F = direct_intensity_vector[['msa_ghg_per_eur', 'msa_lu_per_eur']].to_numpy(dtype=L.dtype)
+
+    # Back to float64 before intensities meet loan amounts and bank totals
+    indirect = (L.T @ F).astype(np.float64, copy=False)
+
+    return pd.DataFrame({
+        'msa_ghg_total_per_eur': indirect[:, 0],
+        'msa_lu_total_per_eur': indirect[:, 1]
+    }, index=leontief_inverse.index)
+
 def compute_bank_biodiversity_footprint(
     loan_data: pd.DataFrame,
     firm_info: pd.DataFrame,
-    direct_intensity_vector: pd.DataFrame,
-    leontief_inverse: pd.DataFrame,
-    msa_ghg_factor: float = 4.37e-5
+    direct_intensity_vector: pd.DataFrame = None,
+    leontief_inverse: pd.DataFrame = None,
+    msa_ghg_factor: float = 4.37e-5,
+    indirect_intensities: pd.DataFrame = None,
+    dtype: type = None
 ) -> pd.DataFrame:
     """
     Compute biodiversity footprint (MSA-loss) for banks based on land use and GHG pressures.
 
     Parameters:
-    - loan_data: DataFrame with columns ['bank_id', 'firm_id', 'loan_amount']
+    - loan_data: DataFrame with columns ['bank_id', 'firm_id', 'loan_amount'];
+        either pandas, an iterable of pandas chunks (e.g. `pd.read_csv(..., chunksize=...)`,
+        streamed with memory proportional to the number of banks), or dask
     - firm_info: DataFrame with ['firm_id', 'country', 'sector']
     - direct_intensity_vector: DataFrame indexed by (country, sector) with columns:
-        ['msa_ghg_per_eur', 'msa_lu_per_eur']
+        ['msa_ghg_per_eur', 'msa_lu_per_eur'] (not needed with indirect_intensities)
     - leontief_inverse: Leontief inverse matrix indexed/columned by (country, sector)
+        (not needed with indirect_intensities)
     - msa_ghg_factor: MSA loss per kg CO₂ for 100-year integration (default GLOBIO: 4.37e-5)
+    - indirect_intensities: optional output of `precompute_indirect_intensities`, to skip the
+        Leontief step when it is shared across calls
+    - dtype: precision of the Leontief step (see `precompute_indirect_intensities`)
 
     Returns:
     - DataFrame: bank-level MSA loss (GHG, LU, total)
-    """
-    # Merge loan and firm metadata
-    df = loan_data.merge(firm_info, on='firm_id', how='left')
-
-    # Match sector-level MSA intensities (F vector)
-    df['key'] = list(zip(df['country'], df['sector']))
-    direct_msa = direct_intensity_vector.copy()
-    direct_msa['key'] = direct_msa.index
-    df = df.merge(direct_msa, on='key', how='left')
-
-    # Compute firm-level direct footprint (MSA-loss * loan exposure)
-    df['msa_ghg_direct'] = df['msa_ghg_per_eur'] * df['loan_amount']
-    df['msa_lu_direct'] = df['msa_lu_per_eur'] * df['loan_amount']
-
-    # --- Indirect footprint using F_tot = L' x diag(F) ---
-    # Construct diagonal matrix of direct intensities
-    F_ghg = np.diag(direct_intensity_vector['msa_ghg_per_eur'].values)
-    F_lu = np.diag(direct_intensity_vector['msa_lu_per_eur'].values)
-
-    # Total impact per euro produced (upstream-inclusive)
-    Ftot_ghg = leontief_inverse.T @ F_ghg
-    Ftot_lu = leontief_inverse.T @ F_lu
-
-    # Aggregate across inputs to get per-country-sector footprints
-    indirect_ghg = pd.Series(Ftot_ghg.sum(axis=1), index=leontief_inverse.index)
-    indirect_lu = pd.Series(Ftot_lu.sum(axis=1), index=leontief_inverse.index)
-
-    indirect_df = pd.DataFrame({
-        'msa_ghg_total_per_eur': indirect_ghg,
-        'msa_lu_total_per_eur': indirect_lu
-    })
-    indirect_df['key'] = indirect_df.index
-
-    df = df.merge(indirect_df, on='key', how='left')
-    df['msa_ghg_total'] = df['msa_ghg_total_per_eur'] * df['loan_amount']
-    df['msa_lu_total'] = df['msa_lu_total_per_eur'] * df['loan_amount']
-
-    # Final aggregation at bank level
-    bank_fp = df.groupby('bank_id').agg({
-        'msa_ghg_total': 'sum',
-        'msa_lu_total': 'sum'
-    }).reset_index()
 
+    With a dask loan table, the per-loan work runs on whichever dask scheduler
+    is active, e.g. after `Client(LocalCluster(n_workers=4))` from dask.distributed.
+    The Leontief step stays in NumPy: it only scales with the number of country-sectors.
+    """
+    # Upstream-inclusive MSA intensities per country-sector, unless precomputed
+    if indirect_intensities is None:
+        if direct_intensity_vector is None or leontief_inverse is None:
+            raise ValueError(
+                "Pass either indirect_intensities or both direct_intensity_vector and leontief_inverse"
+            )
+        indirect_intensities = precompute_indirect_intensities(direct_intensity_vector, leontief_inverse, dtype=dtype)
+    indirect_df = indirect_intensities.rename_axis(['country', 'sector']).reset_index()
+
+    # Shared categorical country/sector keys, so the merge hashes integer codes
+    key_dtypes = {
+        col: _shared_categories(firm_info[col], indirect_df[col])
+        for col in ('country', 'sector')
+    }
+    firm_info = firm_info[['firm_id', 'country', 'sector']].astype(key_dtypes)
+    indirect_df = indirect_df.astype(key_dtypes)
+
+    # Match intensities to firms (one row per firm)
+    firm_msa = firm_info.merge(indirect_df, on=['country', 'sector'], how='left')
+    firm_msa = firm_msa.drop_duplicates('firm_id')[['firm_id', 'msa_ghg_total_per_eur', 'msa_lu_total_per_eur']]
+
+    # Dask: broadcast the (small) firm-level table to every loan partition and sum per bank
+    if dd is not None and isinstance(loan_data, dd.DataFrame):
+        df = loan_data.merge(firm_msa, on='firm_id', how='left', broadcast=True)
+        df['msa_ghg_total'] = df['msa_ghg_total_per_eur'] * df['loan_amount']
+        df['msa_lu_total'] = df['msa_lu_total_per_eur'] * df['loan_amount']
+        bank_fp = (
+            df.groupby('bank_id')[['msa_ghg_total', 'msa_lu_total']].sum()
+            .compute()
+            .sort_index()
+            .reset_index()
+        )
+        bank_fp['msa_total'] = bank_fp['msa_ghg_total'] + bank_fp['msa_lu_total']
+        return bank_fp
+
+    # Per-firm intensity lookup table; its trailing zero row is what loans to
+    # unknown firms (get_indexer -> -1) pick up
+    firm_ids = pd.Index(firm_msa['firm_id'])
+    firm_intensities = np.zeros((len(firm_msa) + 1, 2))
+    firm_intensities[:-1] = firm_msa[['msa_ghg_total_per_eur', 'msa_lu_total_per_eur']].fillna(0).to_numpy()
+
+    # Stream the loans chunk by chunk, keeping only running per-bank totals
+    chunks = [loan_data] if isinstance(loan_data, pd.DataFrame) else loan_data
+    totals = None
+    for chunk in chunks:
+        chunk_totals = _bank_totals(chunk, firm_ids, firm_intensities)
+        totals = chunk_totals if totals is None else totals.add(chunk_totals, fill_value=0)
+    if totals is None:
+        totals = pd.DataFrame({'msa_ghg_total': [], 'msa_lu_total': []}, index=pd.Index([], name='bank_id'))
+
+    bank_fp = totals.sort_index().reset_index()
     bank_fp['msa_total'] = bank_fp['msa_ghg_total'] + bank_fp['msa_lu_total']
     return bank_fp
 
@@ -103,12 +184,14 @@ leontief_inverse = pd.DataFrame(
     columns=idx
 )
 
+# Upstream-inclusive intensities, reusable across loan books
+indirect_intensities = precompute_indirect_intensities(direct_intensity_vector, leontief_inverse)
+
 # Run the biodiversity footprint function
 bank_footprints = compute_bank_biodiversity_footprint(
     loan_data=loan_data,
     firm_info=firm_info,
-    direct_intensity_vector=direct_intensity_vector,
-    leontief_inverse=leontief_inverse
+    indirect_intensities=indirect_intensities
 )
 
 print(bank_footprints)
\ No newline at end of file
@@ -20,49 +20,58 @@ def compute_dependencies(
     Returns:
     - firms_with_scores: firms DataFrame with direct, indirect, and total scores appended
     """
-    firms = firms.copy()
-    firm_keys = list(zip(firms['country'], firms['sector']))
+    firm_keys = pd.MultiIndex.from_arrays([firms['country'], firms['sector']])
 
     es_services = encore_ds_direct.columns
-    results = []
-
-    for (c, j) in firm_keys:
-        firm_row = {'country': c, 'sector': j}
-
-        # Direct dependency
-        try:
-            ds_direct = encore_ds_direct.loc[(c, j)]
-        except KeyError:
-            ds_direct = pd.Series([0.0]*len(es_services), index=es_services)
-
-        # Indirect dependency
-        try:
-            # Extract row from L for firm (c,j)
-            row_L = leontief_inverse.loc[(c, j)]
-            row_sum = row_L.sum()
-            if row_sum > 0:
-                weights = row_L / row_sum
-            else:
-                weights = row_L.copy()
-                weights[:] = 0.0
-
-            # Weighted average of direct dependencies of all suppliers
-            indirect_score = encore_ds_direct.mul(weights.values, axis=0).sum()
-        except KeyError:
-            indirect_score = pd.Series([0.0]*len(es_services), index=es_services)
-
-        # Total dependency
-        total_score = ds_direct + (1 - ds_direct) * indirect_score
-
-        for es in es_services:
-            firm_row[f'{es}_direct'] = ds_direct[es]
-            firm_row[f'{es}_indirect'] = indirect_score[es]
-            firm_row[f'{es}_total'] = total_score[es]
-
-        results.append(firm_row)
-
-    return pd.DataFrame(results)
-
+    n_es = len(es_services)
+    L_vals = leontief_inverse.to_numpy(dtype=np.float64)
+
+    # Both lookup tables carry one trailing zero row: the -1 returned for a
+    # missing (c, j) selects it, so firms with unknown (c, j) score zero
+    # without a fallback vector or mask per firm
+    encore_vals = np.zeros((len(encore_ds_direct) + 1, n_es))
+    encore_vals[:-1] = encore_ds_direct.to_numpy(dtype=np.float64)
+    indirect_matrix = np.zeros((len(L_vals) + 1, n_es))
+
+    # Weighted average of direct dependencies of all suppliers, for every (c, j).
+    # Row-normalising the (N x ES) product equals normalising L first, so no
+    # normalised (N x N) copy of L is built; rows without positive sum get zero weights.
+    # Missing (NaN) supplier scores are skipped, as a pandas sum would
+    row_sums = L_vals.sum(axis=1)
+    positive = row_sums > 0
+    supplier_avg = indirect_matrix[:-1]
+    np.matmul(L_vals, np.nan_to_num(encore_vals[:-1], nan=0.0), out=supplier_avg)
+    supplier_avg /= np.where(positive, row_sums, 1.0)[:, None]
+    supplier_avg[~positive] = 0.0
+
+    # Locate each firm's (c, j) in ENCORE and in L (-1 when missing) through
+    # the hash tables the indexes already hold. Only the distinct (c, j) are
+    # looked up; firms map to them through integer codes
+    key_codes, unique_keys = firm_keys.factorize()
+    direct_idx = encore_ds_direct.index.get_indexer(unique_keys)[key_codes]
+    indirect_idx = leontief_inverse.index.get_indexer(unique_keys)[key_codes]
+
+    # Scores are written straight into one preallocated (firm, service, kind)
+    # block, which flattens to the output column order below
+    scores = np.empty((len(firm_keys), n_es, 3))
+    ds_direct, indirect_score, total_score = scores[:, :, 0], scores[:, :, 1], scores[:, :, 2]
+
+    # Direct and indirect dependency
+    ds_direct[:] = encore_vals[direct_idx]
+    indirect_score[:] = indirect_matrix[indirect_idx]
+
+    # Total dependency: direct + (1 - direct) * indirect
+    np.subtract(1.0, ds_direct, out=total_score)
+    total_score *= indirect_score
+    total_score += ds_direct
+
+    # One column triple (direct, indirect, total) per ecosystem service
+    columns = [f'{es}_{kind}' for es in es_services for kind in ('direct', 'indirect', 'total')]
+
+    return pd.concat([
+        firms.reset_index(drop=True),
+        pd.DataFrame(scores.reshape(len(firm_keys), 3 * n_es), columns=columns)
+    ], axis=1)
 
 # Generate synthetic inputs to test the new function
 # Ecosystem services
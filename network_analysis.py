@@ -1,10 +1,11 @@
 import pandas as pd
+import numpy as np
 import networkx as nx
-from community import community_louvain
+import igraph as ig
 import matplotlib.pyplot as plt
-import itertools
 
-def build_climate_nature_network(climate_df: pd.DataFrame, es_df: pd.DataFrame, id_col: str = "firm_id"):
+def build_climate_nature_network(climate_df: pd.DataFrame, es_df: pd.DataFrame, id_col: str = "firm_id", plot: bool = False,
+                                 min_weight_quantile: float = 0.0):
     """
     Constructs a weighted network connecting climate risk drivers and ecosystem service dependencies.
 
@@ -12,9 +13,12 @@ def build_climate_nature_network(climate_df: pd.DataFrame, es_df: pd.DataFrame,
     - climate_df: DataFrame with firm_id + climate risk columns (e.g., 'floods', 'heat_stress')
     - es_df: DataFrame with firm_id + ES dependency columns (e.g., 'surface_water', 'flood_protection')
     - id_col: name of firm identifier column
+    - plot: draw the network with plot_climate_nature_network (off by default)
+    - min_weight_quantile: drop positive edges below this quantile of the positive weights
+        (e.g. 0.25) to sparsify near-complete networks before community detection
 
     Returns:
-    - G: NetworkX Graph object with communities detected
+    - G: NetworkX Graph object with communities detected (node attribute 'community')
     """
     # Merge firm-level data
     merged = pd.merge(climate_df, es_df, on=id_col, how='inner')
@@ -29,26 +33,59 @@ def build_climate_nature_network(climate_df: pd.DataFrame, es_df: pd.DataFrame,
     G = nx.Graph()
     G.add_nodes_from(all_nodes)
 
-    # Compute edges: pairwise average product of scores
-    for node_i, node_j in itertools.combinations(all_nodes, 2):
-        product_avg = (merged[node_i] * merged[node_j]).mean()
-        if product_avg > 0:
-            G.add_edge(node_i, node_j, weight=product_avg)
+    # Compute edges: pairwise average product of scores, W = X'X / n
+    X = merged[all_nodes].to_numpy(dtype=np.float64)
+    W = (X.T @ X) / max(X.shape[0], 1)
 
-    # Community detection
-    partition = community_louvain.best_partition(G, weight='weight')
+    # Keep each positive pair once (upper triangle)
+    rows, cols = np.triu_indices(len(all_nodes), k=1)
+    weights = W[rows, cols]
+    keep = weights > 0
+    if min_weight_quantile > 0 and keep.any():
+        keep &= weights >= np.quantile(weights[keep], min_weight_quantile)
+    rows, cols, weights = rows[keep], cols[keep], weights[keep]
+    nodes = np.array(all_nodes, dtype=object)
+    G.add_weighted_edges_from(zip(nodes[rows], nodes[cols], weights))
+
+    # Community detection (Louvain, via igraph's C multilevel implementation)
+    g = ig.Graph(n=len(all_nodes), edges=list(zip(rows.tolist(), cols.tolist())), edge_attrs={'weight': weights.tolist()})
+    membership = g.community_multilevel(weights='weight').membership
+    partition = dict(zip(all_nodes, membership))
     nx.set_node_attributes(G, partition, 'community')
 
     # Optional plot
+    if plot:
+        plot_climate_nature_network(G)
+
+    return G
+
+
+def plot_climate_nature_network(G: nx.Graph, pos: dict = None):
+    """
+    Draws a climate-nature network coloured by its Louvain communities.
+
+    Parameters:
+    - G: Graph returned by build_climate_nature_network (nodes carry a 'community' attribute)
+    - pos: optional node positions, e.g. from an earlier plot or an external layout engine;
+        also used as the starting point when only some nodes are placed
+
+    Returns:
+    - pos: node positions used, reusable for later plots of the same network
+    """
+    partition = nx.get_node_attributes(G, 'community')
+
     plt.figure(figsize=(10, 8))
-    pos = nx.spring_layout(G, seed=42, k=0.3)
+    # The network is small and dense, so 20 force-directed iterations (instead of 50) settle it;
+    # nodes already in a complete `pos` are kept as-is
+    if pos is None or len(pos) < G.number_of_nodes():
+        pos = nx.spring_layout(G, pos=pos, seed=42, k=0.3, iterations=20)
     colors = [partition[n] for n in G.nodes()]
     nx.draw_networkx(G, pos, node_color=colors, with_labels=True, edge_color='gray', node_size=600, cmap=plt.cm.Set3)
     plt.title("Climate–Nature Risk Network (Louvain Community Detection)")
     plt.axis("off")
     plt.show()
 
-    return G
+    return pos
 
 
 
@@ -67,4 +104,4 @@ es_scores = pd.DataFrame({
 })
 
 # Build and plot network
-G = build_climate_nature_network(climate_scores, es_scores)
+G = build_climate_nature_network(climate_scores, es_scores, plot=True)